@@ -1,16 +1,228 @@
+import os
+import re
+import time
+
 import cv2
 
 
+BACKENDS = {
+    "any": cv2.CAP_ANY,
+    "v4l2": cv2.CAP_V4L2,
+    "gstreamer": cv2.CAP_GSTREAMER,
+    "ffmpeg": cv2.CAP_FFMPEG,
+    "dshow": cv2.CAP_DSHOW,
+    "msmf": cv2.CAP_MSMF,
+    "avfoundation": cv2.CAP_AVFOUNDATION,
+}
+
+# ---------------------------------------------------------------------
+# Capture profiles. Keys (all optional):
+#   backend      one of BACKENDS
+#   fourcc       e.g. "MJPG" so the camera sends JPEG instead of raw YUYV
+#   fps          requested frame rate (also fills {fps} in pipelines, default 30)
+#   buffer_size  driver queue length (1 = always the freshest frame)
+#   pipeline     full GStreamer pipeline ending in appsink (implies gstreamer);
+#                {index}, {width}, {height} and {fps} are filled in, any other
+#                braces (e.g. caps lists) are left alone
+#   source       file path / URL / device path instead of camera_index
+#   probe        list of (fourcc, width, height, fps) modes to try at startup
+# ---------------------------------------------------------------------
+PROFILES = {
+    "default": {},
+    "mjpeg": {
+        "backend": "v4l2",
+        "fourcc": "MJPG",
+        "fps": 30,
+        "buffer_size": 1,
+        "probe": [("MJPG", 1280, 720, 30), ("MJPG", 640, 480, 30), ("YUYV", 640, 480, 30)],
+    },
+    "jetson-usb": {
+        "pipeline": (
+            "v4l2src device=/dev/video{index} ! image/jpeg,width={width},height={height},framerate={fps}/1 ! "
+            "nvv4l2decoder mjpeg=1 ! nvvidconv ! video/x-raw,format=BGRx ! "
+            "videoconvert ! video/x-raw,format=BGR ! appsink drop=true max-buffers=1"
+        ),
+    },
+    "jetson-csi": {
+        "pipeline": (
+            "nvarguscamerasrc sensor-id={index} ! "
+            "video/x-raw(memory:NVMM),width={width},height={height},framerate={fps}/1 ! "
+            "nvvidconv ! video/x-raw,format=BGRx ! videoconvert ! video/x-raw,format=BGR ! "
+            "appsink drop=true max-buffers=1"
+        ),
+    },
+    # Local testing without a camera
+    "test": {
+        "pipeline": (
+            "videotestsrc is-live=true ! video/x-raw,width={width},height={height},framerate={fps}/1 ! "
+            "videoconvert ! video/x-raw,format=BGR ! appsink drop=true max-buffers=1"
+        ),
+    },
+}
+
+
+def fourcc_to_str(value) -> str:
+    """Decode CAP_PROP_FOURCC (a float) into its 4-character code."""
+    code = int(value)
+    if code <= 0:
+        return "----"
+    return "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4))
+
+
+# Capture FPS is measured at startup by grabbing this many frames
+FPS_MEASURE_FRAMES = 15
+
+
+def gstreamer_available() -> bool:
+    """True if this OpenCV build was compiled with GStreamer support."""
+    return re.search(r"GStreamer:\s*YES", cv2.getBuildInformation()) is not None
+
+
+def fill_pipeline(pipeline: str, index: int, width: int, height: int, fps: int) -> str:
+    """Fill the placeholders of a pipeline profile without touching other braces."""
+    return (
+        pipeline
+        .replace("{index}", str(index))
+        .replace("{width}", str(width))
+        .replace("{height}", str(height))
+        .replace("{fps}", str(fps))
+    )
+
+
 class CameraService:
-    def __init__(self, camera_index: int = 0, width: int = 640, height: int = 480):
-        self.cap = cv2.VideoCapture(camera_index)
+    def __init__(self, camera_index: int = 0, width: int = 640, height: int = 480, profile=None):
+        """
+        profile: name from PROFILES, a profile dict, or None for the plain
+        default capture (POS_CAMERA_PROFILE env var is used when None).
+        """
+        if profile is None:
+            profile = os.environ.get("POS_CAMERA_PROFILE", "default")
+        if isinstance(profile, str):
+            if profile not in PROFILES:
+                raise ValueError(f"Unknown camera profile '{profile}'. Choose from: {', '.join(PROFILES)}")
+            profile = PROFILES[profile]
+        self.profile = profile
+        self.supported_modes = []
+        self.capture_fps = None
+
+        backend_name = profile.get("backend", "any")
+        if backend_name not in BACKENDS:
+            raise ValueError(f"Unknown camera backend '{backend_name}'. Choose from: {', '.join(BACKENDS)}")
 
-        # Optional: set resolution
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        pipeline = profile.get("pipeline")
+        is_file = False
+        if pipeline:
+            # The opencv-python wheels on PyPI are built without GStreamer
+            if not gstreamer_available():
+                raise RuntimeError(
+                    "Camera profile needs GStreamer, but this OpenCV build has no GStreamer "
+                    "support. Install a GStreamer-enabled OpenCV (e.g. the JetPack OpenCV "
+                    "on Jetson, or build opencv-python with -DWITH_GSTREAMER=ON)."
+                )
+            pipeline = fill_pipeline(pipeline, camera_index, width, height, profile.get("fps", 30))
+            self.cap = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
+            source_desc = pipeline
+        else:
+            source = profile.get("source", camera_index)
+            is_file = isinstance(source, str) and os.path.isfile(source)
+            self.cap = cv2.VideoCapture(source, BACKENDS[backend_name])
+            source_desc = source
 
         if not self.cap.isOpened():
-            raise RuntimeError(f"Cannot open camera with index {camera_index}")
+            raise RuntimeError(f"Cannot open camera source {source_desc}")
+
+        # A GStreamer pipeline already fixes the format in its caps, so only
+        # configure the device for plain captures (ignored for file sources).
+        if not pipeline:
+            if profile.get("probe"):
+                self.supported_modes = self.probe_modes(profile["probe"])
+
+            # FOURCC has to be set before the size for most V4L2 drivers
+            if profile.get("fourcc"):
+                self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*profile["fourcc"]))
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+            if profile.get("fps"):
+                self.cap.set(cv2.CAP_PROP_FPS, profile["fps"])
+            if profile.get("buffer_size"):
+                self.cap.set(cv2.CAP_PROP_BUFFERSIZE, profile["buffer_size"])
+
+        self.report(measure=not is_file)
+
+    def probe_modes(self, modes):
+        """
+        Try each (fourcc, width, height, fps) mode and return the ones the
+        device actually accepted, as reported back by the driver.
+        The device is put back in the mode it was in before probing.
+        """
+        original = self.negotiated_format()
+        supported = []
+        for fourcc, width, height, fps in modes:
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+            self.cap.set(cv2.CAP_PROP_FPS, fps)
+
+            got = self.negotiated_format()
+            ok = (got["fourcc"] == fourcc and got["width"] == width and got["height"] == height)
+            print(f"[CameraService] probe {fourcc} {width}x{height}@{fps}: "
+                  f"{'ok' if ok else 'got ' + self._format_str(got)}")
+            if ok:
+                supported.append(got)
+
+        if original["fourcc"] != "----":
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*original["fourcc"]))
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, original["width"])
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, original["height"])
+        if original["fps"] > 0:
+            self.cap.set(cv2.CAP_PROP_FPS, original["fps"])
+        return supported
+
+    def negotiated_format(self):
+        """Return the format the backend actually settled on."""
+        return {
+            "backend": self.cap.getBackendName(),
+            "fourcc": fourcc_to_str(self.cap.get(cv2.CAP_PROP_FOURCC)),
+            "width": int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": self.cap.get(cv2.CAP_PROP_FPS),
+        }
+
+    @staticmethod
+    def _format_str(fmt):
+        return f"{fmt['fourcc']} {fmt['width']}x{fmt['height']}@{fmt['fps']:.1f}"
+
+    def measure_fps(self, num_frames: int = FPS_MEASURE_FRAMES):
+        """
+        Grab (without decoding) num_frames and return the device's capture FPS.
+        The first grab starts the stream and is not timed. Returns 0.0 on failure.
+        """
+        if not self.cap.grab():
+            return 0.0
+        start = time.perf_counter()
+        grabbed = 0
+        for _ in range(num_frames):
+            if not self.cap.grab():
+                break
+            grabbed += 1
+        elapsed = time.perf_counter() - start
+        return grabbed / elapsed if grabbed and elapsed > 0 else 0.0
+
+    def report(self, measure: bool = True):
+        """
+        Print the negotiated format and the capture FPS.
+        For file sources (measure=False) the container FPS is reported instead,
+        so no frames are consumed.
+        """
+        fmt = self.negotiated_format()
+        if measure:
+            self.capture_fps = self.measure_fps()
+            fps_text = f"capture {self.capture_fps:.1f} FPS"
+        else:
+            self.capture_fps = fmt["fps"]
+            fps_text = f"file {self.capture_fps:.1f} FPS"
+        print(f"[CameraService] {fmt['backend']}: {self._format_str(fmt)}, {fps_text}")
+        return fmt
 
     def read_frame(self):
         """Grab a single frame from the camera. Returns None if failed."""
@@ -26,7 +238,19 @@ class CameraService:
 
 
 if __name__ == "__main__":
-    cam = CameraService()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Camera capture test")
+    parser.add_argument("--index", type=int, default=0)
+    parser.add_argument("--profile", default=None, help=f"one of: {', '.join(PROFILES)}")
+    parser.add_argument("--source", help="video file / URL to use instead of a camera")
+    args = parser.parse_args()
+
+    profile = args.profile
+    if args.source:
+        profile = {"source": args.source}
+
+    cam = CameraService(camera_index=args.index, profile=profile)
 
     while True:
         frame = cam.read_frame()
@@ -41,4 +265,4 @@ if __name__ == "__main__":
             break
 
     cam.release()
-    cv2.destroyAllWindows()
\ No newline at end of file
+    cv2.destroyAllWindows()
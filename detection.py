@@ -4,6 +4,7 @@ from ultralytics import YOLO
 
 from camera_service import CameraService
 from csv_manager import ItemCatalog
+from postprocess import LabelTable, from_boxes
 
 
 MODEL_PATH = r"/Users/rjbagunu/Desktop/Grad School (PhD AI) /AI 231/Machine Exercises/ME7 POS/best.pt"
@@ -17,6 +18,7 @@ def main():
 
     # Load item catalog
     catalog = ItemCatalog()
+    label_table = LabelTable(catalog)
 
     # Start camera
     cam = CameraService()
@@ -33,19 +35,11 @@ def main():
         results = model(frame, verbose=False)[0]  # first (and only) result
 
         # Draw detections
-        for box in results.boxes:
-            conf = float(box.conf[0])
-            if conf < CONF_THRESHOLD:
-                continue
-
-            cls_id = int(box.cls[0])
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-
-            meta = catalog.get(cls_id)
-            if meta is not None:
-                label = f"{meta['product']} {conf:.2f}"
-            else:
-                label = f"ID {cls_id} {conf:.2f}"
+        dets = from_boxes(results.boxes, CONF_THRESHOLD)
+        labels = label_table.lookup(dets.cls)
+
+        for (x1, y1, x2, y2), name, conf in zip(dets.xyxy.tolist(), labels, dets.conf.tolist()):
+            label = f"{name} {conf:.2f}"
 
             # Draw bounding box
             cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
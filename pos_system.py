@@ -7,11 +7,22 @@ from camera_service import CameraService
 from csv_manager import ItemCatalog
 from cart_manager import CartManager
 from hand_gesture import HandGestureService
+from postprocess import LabelTable, TrackCounter, from_boxes
+from session_store import SessionStore
 
 
-MODEL_PATH = os.path.join(os.path.dirname(__file__), "best.pt")
+# Override with POS_MODEL_PATH to run a quantized variant (see quantize_model.py)
+MODEL_PATH = os.environ.get(
+    "POS_MODEL_PATH", os.path.join(os.path.dirname(__file__), "best.pt")
+)
+# POS_MODEL_HALF=1 runs a .pt model in FP16 (CUDA only, ignored on CPU)
+MODEL_HALF = os.environ.get("POS_MODEL_HALF") == "1"
 CONF_THRESHOLD = 0.7
 
+# After a resume, tracks seen in this many frames are items that were
+# already on the counter (and in the restored cart) when the lane went down
+RESUME_SETTLE_FRAMES = 15
+
 
 def print_receipt(cart: CartManager):
     print("\n===== RECEIPT =====")
@@ -27,12 +38,13 @@ def print_receipt(cart: CartManager):
 
 def main():
     print("Loading YOLO model...")
-    model = YOLO(MODEL_PATH)
+    model = YOLO(MODEL_PATH, task="detect")
 
     catalog = ItemCatalog()
     cart = CartManager(catalog)
+    label_table = LabelTable(catalog)
     audio = AudioService()
-    cam = CameraService()
+    cam = CameraService()  # capture profile from POS_CAMERA_PROFILE (see camera_service.PROFILES)
     gesture = HandGestureService()
 
     # ------------------------------
@@ -54,7 +66,9 @@ def main():
     # ITEM DETECTION / TRACKING
     # ------------------------------
     item_present = False          # True if any item is visible this frame
-    counted_tracks = set()        # set of (class_id, track_id) we've already added to cart
+    counted_tracks = TrackCounter()  # (class_id, track_id) pairs we've already added to cart
+    track_id_offset = 0           # shifts tracker ids after a resume so they don't clash
+    resume_settle_frames = 0      # frames left whose new tracks are marked counted, not added
 
     # ------------------------------
     # UI / SUMMARY
@@ -63,6 +77,26 @@ def main():
     show_summary = False          # whether to draw big summary banner
     summary_total = 0.0           # last session's total
 
+    # ------------------------------
+    # RESUME AFTER CRASH / RESTART
+    # ------------------------------
+    store = SessionStore()
+    snapshot = store.load()
+    if snapshot is not None and snapshot["session_open"]:
+        session_open = True
+        phase = snapshot["phase"]
+        for cid, qty in snapshot["items"].items():
+            cart.add_item(cid, qty)
+        counted_tracks.add_pairs(snapshot["counted_tracks"])
+
+        # The tracker restarts its ids at 1 in a new process, so push new
+        # ids past the restored ones or they would be treated as counted.
+        track_id_offset = max((tid for _, tid in snapshot["counted_tracks"]), default=0) + 1
+        # Items still on the counter get fresh track ids from the new tracker;
+        # absorb them for a few frames so they are not charged twice.
+        resume_settle_frames = RESUME_SETTLE_FRAMES
+        print(f"\n=== SESSION RESUMED ({sum(snapshot['items'].values())} items) ===")
+
     while True:
         frame = cam.read_frame()
         if frame is None:
@@ -102,29 +136,22 @@ def main():
                 frame,
                 persist=True,
                 conf=CONF_THRESHOLD,
+                half=MODEL_HALF,
                 verbose=False
             )[0]
 
-            for box in results.boxes:
-                conf = float(box.conf[0])
-                if conf < CONF_THRESHOLD:
-                    continue
+            # Convert all boxes to NumPy once, then work on arrays
+            dets = from_boxes(results.boxes, CONF_THRESHOLD)
+            if track_id_offset and dets.track_ids is not None:
+                dets.track_ids += track_id_offset
+            labels = label_table.lookup(dets.cls)
 
-                cid = int(box.cls[0])  # class id from YOLO
-
-                # Track ID from the tracker
-                track_id = None
-                if hasattr(box, "id") and box.id is not None:
-                    track_id = int(box.id[0])
-
-                # Mark that some item is visible this frame
-                item_present = True
-
-                # Draw bounding box + label (optionally show track id)
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                meta = catalog.get(cid)
-                label = meta["product"] if meta else f"ID {cid}"
+            # Mark that some item is visible this frame
+            item_present = len(dets) > 0
 
+            # Draw bounding box + label (optionally show track id)
+            track_ids = dets.track_ids.tolist() if dets.track_ids is not None else [None] * len(dets)
+            for (x1, y1, x2, y2), label, track_id in zip(dets.xyxy.tolist(), labels, track_ids):
                 display_label = label if track_id is None else f"{label} #{track_id}"
 
                 cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
@@ -138,19 +165,20 @@ def main():
                     2,
                 )
 
-                # ------------------- COUNT ONCE PER TRACK -------------------
-                if track_id is not None:
-                    key = (cid, track_id)
-                    if key not in counted_tracks:
-                        counted_tracks.add(key)
-                        cart.add_item(cid)
-                        meta = catalog.get(cid)
-                        name = meta["product"] if meta else f"ID {cid}"
-                        print(f"Added: {name}")
-                        audio.play_beep()
-                else:
-                    # Fallback: if no track id (should be rare), skip to avoid spam.
-                    pass
+            # ------------------- COUNT ONCE PER TRACK -------------------
+            # Only boxes with a new (class_id, track_id) reach the Python loop.
+            # Boxes without a track id (should be rare) are skipped to avoid spam.
+            new_idx = counted_tracks.add_new(dets)
+            if resume_settle_frames > 0:
+                # Right after a resume: remember the tracks, don't add them
+                resume_settle_frames -= 1
+                new_idx = new_idx[:0]
+
+            for i in new_idx:
+                cid = int(dets.cls[i])
+                cart.add_item(cid)
+                print(f"Added: {labels[i]}")
+                audio.play_beep()
 
         else:
             item_present = False
@@ -208,6 +236,9 @@ def main():
                 except Exception as e:
                     print(f"[Warning] TTS failed: {e}")
 
+        # Snapshot session state (only written when something changed)
+        store.update(session_open, phase, cart.items, counted_tracks)
+
         # ============================================================
         # 5) DRAW RECEIPT PANEL
         # ============================================================
@@ -317,6 +348,7 @@ def main():
         if key == ord("q"):
             break
 
+    store.close()
     cam.release()
     cv2.destroyAllWindows()
 
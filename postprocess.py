@@ -0,0 +1,150 @@
+import numpy as np
+
+from csv_manager import ItemCatalog
+
+
+class Detections:
+    """
+    One frame of detections as NumPy arrays (already filtered by confidence).
+    xyxy: Nx4 int, conf: N float, cls: N int, track_ids: N int or None.
+    """
+
+    def __init__(self, xyxy, conf, cls, track_ids=None):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+        self.track_ids = track_ids
+
+    def __len__(self):
+        return len(self.cls)
+
+    @classmethod
+    def empty(cls):
+        return cls(
+            np.zeros((0, 4), dtype=np.int32),
+            np.zeros(0, dtype=np.float32),
+            np.zeros(0, dtype=np.int64),
+        )
+
+
+def from_boxes(boxes, conf_threshold: float) -> Detections:
+    """
+    Convert ultralytics `results.boxes` to NumPy once per frame and filter by conf.
+
+    boxes.data is Nx6 (x1, y1, x2, y2, conf, cls) or, when tracking,
+    Nx7 (x1, y1, x2, y2, track_id, conf, cls). Reading it in one go avoids
+    a tensor -> Python conversion per box and per field.
+    """
+    data = boxes.data
+    if hasattr(data, "cpu"):
+        data = data.cpu().numpy()
+    data = np.asarray(data)
+
+    if data.shape[0] == 0:
+        return Detections.empty()
+
+    keep = data[:, -2] >= conf_threshold
+    data = data[keep]
+
+    track_ids = data[:, 4].astype(np.int64) if data.shape[1] == 7 else None
+    return Detections(
+        xyxy=data[:, :4].astype(np.int32),
+        conf=data[:, -2].astype(np.float32),
+        cls=data[:, -1].astype(np.int64),
+        track_ids=track_ids,
+    )
+
+
+class LabelTable:
+    """Class id -> product name lookup table built once from the catalog."""
+
+    def __init__(self, catalog: ItemCatalog):
+        size = max(catalog.items) + 1 if catalog.items else 0
+        self._names = np.array([f"ID {cid}" for cid in range(size)], dtype=object)
+        for cid, meta in catalog.items.items():
+            self._names[cid] = meta["product"]
+
+    def lookup(self, cls):
+        """Return an object array of product names for an array of class ids."""
+        cls = np.asarray(cls, dtype=np.int64)
+        known = (cls >= 0) & (cls < len(self._names))
+        labels = np.empty(len(cls), dtype=object)
+        labels[known] = self._names[cls[known]]
+        # Unknown ids are rare, so formatting them one by one is fine
+        for i in np.flatnonzero(~known):
+            labels[i] = f"ID {cls[i]}"
+        return labels
+
+
+class TrackCounter:
+    """
+    Remembers which (class_id, track_id) pairs were already added to the cart.
+    Pairs are packed into one int64 key so a whole frame is checked with np.isin.
+    """
+
+    def __init__(self):
+        self._keys = np.zeros(0, dtype=np.int64)
+
+    @staticmethod
+    def _pack(cls, track_ids):
+        return (np.asarray(cls, dtype=np.int64) << 32) | (
+            np.asarray(track_ids, dtype=np.int64) & 0xFFFFFFFF
+        )
+
+    def clear(self):
+        self._keys = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def pairs(self):
+        """Return the counted tracks as a list of (class_id, track_id) tuples."""
+        cls = (self._keys >> 32).tolist()
+        ids = (self._keys & 0xFFFFFFFF).tolist()
+        return list(zip(cls, ids))
+
+    def add_pairs(self, pairs):
+        """Mark (class_id, track_id) pairs as counted."""
+        if not pairs:
+            return
+        cls, ids = zip(*pairs)
+        self._keys = np.union1d(self._keys, self._pack(cls, ids))
+
+    def add_new(self, dets: Detections):
+        """
+        Mark this frame's tracks as counted and return the indices (into dets)
+        of the ones that were not counted before. Boxes without a track id
+        are never counted.
+        """
+        if dets.track_ids is None or len(dets) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        keys = self._pack(dets.cls, dets.track_ids)
+        # First occurrence of each key in this frame that is not already known
+        uniq, first_idx = np.unique(keys, return_index=True)
+        is_new = ~np.isin(uniq, self._keys, assume_unique=True)
+        new_idx = np.sort(first_idx[is_new])
+
+        if len(new_idx):
+            self._keys = np.union1d(self._keys, uniq[is_new])
+        return new_idx
+
+
+# Quick manual test
+if __name__ == "__main__":
+    class FakeBoxes:
+        # x1, y1, x2, y2, track_id, conf, cls
+        data = np.array([
+            [10, 10, 50, 50, 1, 0.90, 3],
+            [60, 10, 90, 50, 2, 0.40, 0],
+            [10, 60, 50, 90, 3, 0.80, 99],
+        ], dtype=np.float32)
+
+    labels = LabelTable(ItemCatalog())
+    counter = TrackCounter()
+
+    dets = from_boxes(FakeBoxes(), conf_threshold=0.7)
+    print("labels:", labels.lookup(dets.cls).tolist())
+    print("new:", counter.add_new(dets).tolist())
+    print("new again:", counter.add_new(dets).tolist())
+    print("counted:", counter.pairs())
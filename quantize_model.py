@@ -0,0 +1,517 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+from csv_manager import ItemCatalog
+
+# ---------------------------------------------------------------------
+# onnx / onnxruntime are only needed for the INT8 variants
+# (requirements-quantize.txt). Without them we still benchmark PyTorch.
+# ---------------------------------------------------------------------
+try:
+    import onnx
+    from onnxruntime.quantization import (
+        CalibrationDataReader,
+        QuantFormat,
+        QuantType,
+        quantize_dynamic,
+        quantize_static,
+    )
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+    ORT_AVAILABLE = True
+except Exception as e:
+    CalibrationDataReader = object
+    ORT_AVAILABLE = False
+    print("[Quantize] onnx/onnxruntime NOT available, INT8 variants disabled.")
+    print("  Install with: pip install -r requirements-quantize.txt")
+    print("  Reason:", e)
+
+# Peak RSS comes from getrusage, which Windows does not have
+try:
+    import resource
+except Exception:
+    resource = None
+
+try:
+    import torch
+    CUDA_AVAILABLE = torch.cuda.is_available()
+except Exception:
+    CUDA_AVAILABLE = False
+
+
+# Same model and threshold pos_system.py uses
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "best.pt")
+CONF_THRESHOLD = 0.7
+
+# Low threshold for the mAP candidates (counts still use CONF_THRESHOLD)
+MAP_CONF = 0.25
+IOU_MATCH = 0.5
+IMG_SIZE = 640
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+VIDEO_EXTS = (".mp4", ".avi", ".mov", ".mkv")
+
+
+def load_frames(frames_dir: str, max_frames: int = 500, video_stride: int = 5):
+    """
+    Load recorded counter frames from a folder.
+    Images are used as-is; videos are sampled every `video_stride` frames.
+    """
+    frames = []
+    for path in sorted(glob.glob(os.path.join(frames_dir, "*"))):
+        ext = os.path.splitext(path)[1].lower()
+        if ext in IMAGE_EXTS:
+            frame = cv2.imread(path)
+            if frame is not None:
+                frames.append(frame)
+        elif ext in VIDEO_EXTS:
+            cap = cv2.VideoCapture(path)
+            idx = 0
+            while len(frames) < max_frames:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                if idx % video_stride == 0:
+                    frames.append(frame)
+                idx += 1
+            cap.release()
+
+        if len(frames) >= max_frames:
+            break
+
+    return frames[:max_frames]
+
+
+def split_frames(frames, calib_frames: int):
+    """
+    Split frames into (calibration, evaluation) sets.
+    Every k-th frame goes to calibration so both sets cover the whole
+    recording, and static INT8 is never scored on frames it was calibrated on.
+    """
+    if calib_frames <= 0 or len(frames) < 2:
+        return [], frames
+
+    step = max(2, len(frames) // calib_frames)
+    calib_idx = set(range(0, len(frames), step)[:calib_frames])
+    calib = [f for i, f in enumerate(frames) if i in calib_idx]
+    evaluate = [f for i, f in enumerate(frames) if i not in calib_idx]
+    return calib, evaluate
+
+
+def letterbox_tensor(frame, size: int = IMG_SIZE):
+    """Resize + pad a BGR frame the way YOLO does and return a 1x3xHxW float32 tensor."""
+    h, w = frame.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top = (size - new_h) // 2
+    left = (size - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+
+    rgb = cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB)
+    chw = rgb.transpose(2, 0, 1).astype(np.float32) / 255.0
+    return chw[np.newaxis]
+
+
+class FrameCalibrationReader(CalibrationDataReader):
+    """Feeds recorded counter frames to onnxruntime static INT8 calibration."""
+
+    def __init__(self, frames, input_name: str = "images"):
+        self.input_name = input_name
+        self._iter = iter(frames)
+
+    def get_next(self):
+        frame = next(self._iter, None)
+        if frame is None:
+            return None
+        return {self.input_name: letterbox_tensor(frame)}
+
+
+# ---------------------------------------------------------------------
+# Building variants
+# ---------------------------------------------------------------------
+def head_nodes_to_exclude(onnx_path: str):
+    """
+    Names of the detection head's output nodes, to keep them in float.
+
+    Walks back from the graph outputs up to (and including) the last Conv on
+    each path. That covers the decode / DFL / sigmoid / final Concat, where
+    box coordinates (0-640) and class scores (0-1) share one tensor and a
+    single INT8 scale would crush the scores to zero.
+    """
+    graph = onnx.load(onnx_path).graph
+    producers = {out: node for node in graph.node for out in node.output}
+
+    excluded = set()
+    stack = [producers[o.name] for o in graph.output if o.name in producers]
+    while stack:
+        node = stack.pop()
+        if node.name in excluded:
+            continue
+        excluded.add(node.name)
+        if node.op_type == "Conv":
+            continue
+        stack.extend(producers[i] for i in node.input if i in producers)
+
+    # Also pick up nodes that sit between excluded ones (e.g. the DFL softmax
+    # between the head Split and the DFL Conv, which stopped the walk above)
+    consumers = {}
+    for node in graph.node:
+        for i in node.input:
+            consumers.setdefault(i, []).append(node)
+    changed = True
+    while changed:
+        changed = False
+        for node in graph.node:
+            if node.name in excluded:
+                continue
+            fed = any(producers[i].name in excluded for i in node.input if i in producers)
+            feeds = any(c.name in excluded for o in node.output for c in consumers.get(o, []))
+            if fed and feeds:
+                excluded.add(node.name)
+                changed = True
+    return sorted(excluded)
+
+
+def _variant(name: str, path: str, half: bool = False):
+    deploy = {"POS_MODEL_PATH": os.path.abspath(path)}
+    predict_kwargs = {}
+    if half:
+        deploy["POS_MODEL_HALF"] = "1"
+        predict_kwargs = {"half": True, "device": 0}
+    return {"name": name, "path": path, "predict_kwargs": predict_kwargs, "deploy": deploy}
+
+
+def build_variants(model_path: str, calib_frames, out_dir: str):
+    """
+    Return a list of variants: {name, path, predict_kwargs, deploy}.
+    `deploy` holds the environment variables pos_system.py needs to run it.
+    Variants that are not supported on this machine are skipped with a message.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    variants = [_variant("fp32", model_path)]
+
+    # FP16 only makes sense (and only works in ultralytics) on a CUDA device
+    if CUDA_AVAILABLE:
+        variants.append(_variant("fp16", model_path, half=True))
+    else:
+        print("[Quantize] No CUDA device, skipping fp16.")
+
+    if not ORT_AVAILABLE:
+        return variants
+
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+
+    # ultralytics always exports next to the source model, so move it into out_dir
+    print("Exporting ONNX (fp32)...")
+    exported = YOLO(model_path).export(format="onnx", imgsz=IMG_SIZE, dynamic=False)
+    onnx_path = os.path.join(out_dir, f"{stem}.onnx")
+    shutil.move(exported, onnx_path)
+    variants.append(_variant("onnx-fp32", onnx_path))
+
+    # Shape inference + graph cleanup recommended by onnxruntime before quantizing
+    prep_path = os.path.join(out_dir, f"{stem}-prep.onnx")
+    try:
+        quant_pre_process(onnx_path, prep_path)
+    except Exception as e:
+        print(f"[Quantize] Pre-processing failed, quantizing the raw export: {e}")
+        prep_path = onnx_path
+
+    # Dynamic INT8: weights quantized offline, activations at runtime (no calibration)
+    dyn_path = os.path.join(out_dir, f"{stem}-int8-dynamic.onnx")
+    try:
+        quantize_dynamic(prep_path, dyn_path, weight_type=QuantType.QUInt8)
+        variants.append(_variant("onnx-int8-dynamic", dyn_path))
+    except Exception as e:
+        print(f"[Quantize] Dynamic INT8 failed: {e}")
+
+    # Static INT8: activation ranges calibrated on recorded counter frames
+    if calib_frames:
+        static_path = os.path.join(out_dir, f"{stem}-int8-static.onnx")
+        try:
+            quantize_static(
+                prep_path,
+                static_path,
+                FrameCalibrationReader(calib_frames),
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                per_channel=True,
+                nodes_to_exclude=head_nodes_to_exclude(prep_path),
+            )
+            variants.append(_variant("onnx-int8-static", static_path))
+        except Exception as e:
+            print(f"[Quantize] Static INT8 failed: {e}")
+    else:
+        print("[Quantize] No calibration frames, skipping static INT8.")
+
+    return variants
+
+
+# ---------------------------------------------------------------------
+# Evaluation
+# ---------------------------------------------------------------------
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_variant(variant, frames, class_ids, warmup: int = 5):
+    """
+    Run one variant over all frames.
+    Returns (detections per frame, latencies in ms, peak memory in MB).
+    Each detection array is Nx6: x1, y1, x2, y2, conf, cls (catalog classes only).
+
+    Meant to run in a fresh process (see _benchmark_in_subprocess): the memory
+    figure is how far loading and running the model raised the process peak
+    RSS above what imports and frames already used.
+    """
+    rss_before = _peak_rss_mb()
+    model = YOLO(variant["path"], task="detect")
+    kwargs = dict(conf=MAP_CONF, imgsz=IMG_SIZE, verbose=False, **variant["predict_kwargs"])
+
+    for frame in frames[:warmup]:
+        model.predict(frame, **kwargs)
+
+    detections = []
+    latencies = []
+    for frame in frames:
+        start = time.perf_counter()
+        result = model.predict(frame, **kwargs)[0]
+        latencies.append((time.perf_counter() - start) * 1000.0)
+
+        boxes = result.boxes
+        dets = np.concatenate([
+            boxes.xyxy.cpu().numpy(),
+            boxes.conf.cpu().numpy()[:, None],
+            boxes.cls.cpu().numpy()[:, None],
+        ], axis=1) if len(boxes) else np.zeros((0, 6), dtype=np.float32)
+
+        dets = dets[np.isin(dets[:, 5].astype(int), class_ids)]
+        detections.append(dets)
+
+    rss_after = _peak_rss_mb()
+    mem_peak = None if rss_before is None else rss_after - rss_before
+    return detections, latencies, mem_peak
+
+
+def _benchmark_worker(variant, frames_dir, max_frames, calib_frames, class_ids):
+    # Reload frames here instead of pickling hundreds of MB across processes
+    frames = load_frames(frames_dir, max_frames=max_frames)
+    _, eval_frames = split_frames(frames, calib_frames)
+    return run_variant(variant, eval_frames, class_ids)
+
+
+def _benchmark_in_subprocess(variant, frames_dir, max_frames, calib_frames, class_ids):
+    """Run one variant in its own process so its memory use is not mixed with the others."""
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        future = pool.submit(
+            _benchmark_worker, variant, frames_dir, max_frames, calib_frames, class_ids
+        )
+        return future.result()
+
+
+def box_iou(a, b):
+    """IoU matrix between Nx4 and Mx4 xyxy boxes."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(br - tl, 0, None).prod(axis=2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(axis=1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def average_precision(recall, precision):
+    """All-point interpolated AP (VOC / COCO style)."""
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    idx = np.where(mrec[1:] != mrec[:-1])[0]
+    return float(np.sum((mrec[idx + 1] - mrec[idx]) * mpre[idx + 1]))
+
+
+def map50_vs_baseline(baseline_dets, variant_dets, class_ids):
+    """
+    mAP@0.5 of the variant, using the FP32 baseline detections above
+    CONF_THRESHOLD as ground truth.
+    """
+    aps = []
+    for cid in class_ids:
+        scores, hits = [], []
+        n_gt = 0
+        for gt_all, pred_all in zip(baseline_dets, variant_dets):
+            gt = gt_all[(gt_all[:, 5] == cid) & (gt_all[:, 4] >= CONF_THRESHOLD)]
+            pred = pred_all[pred_all[:, 5] == cid]
+            pred = pred[np.argsort(-pred[:, 4])]
+            n_gt += len(gt)
+
+            ious = box_iou(pred[:, :4], gt[:, :4])
+            matched = np.zeros(len(gt), dtype=bool)
+            for i in range(len(pred)):
+                hit = False
+                if len(gt):
+                    j = int(np.argmax(ious[i]))
+                    if ious[i, j] >= IOU_MATCH and not matched[j]:
+                        matched[j] = True
+                        hit = True
+                scores.append(pred[i, 4])
+                hits.append(hit)
+
+        if n_gt == 0:
+            continue  # class never seen by the baseline on these frames
+
+        order = np.argsort(-np.asarray(scores))
+        tp = np.asarray(hits, dtype=float)[order]
+        tp_cum = np.cumsum(tp)
+        fp_cum = np.cumsum(1.0 - tp)
+        recall = tp_cum / n_gt
+        precision = tp_cum / np.maximum(tp_cum + fp_cum, 1e-9)
+        aps.append(average_precision(recall, precision))
+
+    return float(np.mean(aps)) if aps else None
+
+
+def frame_counts(dets):
+    """Per-class item counts for one frame at the POS confidence threshold."""
+    kept = dets[dets[:, 4] >= CONF_THRESHOLD]
+    return Counter(kept[:, 5].astype(int).tolist())
+
+
+def count_agreement(baseline_dets, variant_dets):
+    """Fraction of frames where the per-class counts match the baseline exactly."""
+    if not baseline_dets:
+        return None
+    same = sum(
+        frame_counts(b) == frame_counts(v)
+        for b, v in zip(baseline_dets, variant_dets)
+    )
+    return same / len(baseline_dets)
+
+
+def build_report(variants, frames_dir, max_frames, calib_frames, class_ids):
+    """
+    Run every variant (each in its own process, on the evaluation frames only)
+    and compare it against the first (fp32) one.
+    """
+    rows = []
+    baseline_dets = None
+
+    for variant in variants:
+        print(f"Benchmarking {variant['name']}...")
+        try:
+            dets, latencies, mem_peak = _benchmark_in_subprocess(
+                variant, frames_dir, max_frames, calib_frames, class_ids
+            )
+        except Exception as e:
+            if baseline_dets is None:
+                raise RuntimeError(f"Baseline {variant['name']} failed, nothing to compare against") from e
+            print(f"[Quantize] Benchmark of {variant['name']} failed, skipping: {e}")
+            continue
+
+        if baseline_dets is None:
+            baseline_dets = dets
+
+        lat = np.asarray(latencies)
+        rows.append({
+            "variant": variant["name"],
+            "path": variant["path"],
+            "deploy": variant["deploy"],
+            "size_mb": os.path.getsize(variant["path"]) / (1024 * 1024),
+            "mem_peak_mb": mem_peak,
+            "latency_ms_mean": float(lat.mean()),
+            "latency_ms_p95": float(np.percentile(lat, 95)),
+            "map50_vs_fp32": map50_vs_baseline(baseline_dets, dets, class_ids),
+            "count_agreement": count_agreement(baseline_dets, dets),
+        })
+
+    return rows
+
+
+def pick_fastest(rows, min_agreement: float):
+    """Fastest variant whose counts agree with fp32 on at least min_agreement of frames."""
+    ok = [r for r in rows if (r["count_agreement"] or 0.0) >= min_agreement]
+    if not ok:
+        return None
+    return min(ok, key=lambda r: r["latency_ms_mean"])
+
+
+def print_report(rows, best):
+    def fmt(value, spec):
+        return "-" if value is None else format(value, spec)
+
+    print("\n===== QUANTIZATION REPORT =====")
+    print(f"{'variant':20} {'size MB':>8} {'peak MB':>8} {'mean ms':>8} "
+          f"{'p95 ms':>8} {'mAP50':>7} {'count%':>7}")
+    for r in rows:
+        agreement = None if r["count_agreement"] is None else r["count_agreement"] * 100
+        print(f"{r['variant']:20} {fmt(r['size_mb'], '8.1f')} "
+              f"{fmt(r['mem_peak_mb'], '8.1f')} {fmt(r['latency_ms_mean'], '8.1f')} "
+              f"{fmt(r['latency_ms_p95'], '8.1f')} {fmt(r['map50_vs_fp32'], '7.3f')} "
+              f"{fmt(agreement, '7.1f')}")
+    print("===============================")
+    if best is None:
+        print("No variant met the count agreement threshold.")
+    else:
+        env = " ".join(f"{k}={v}" for k, v in best["deploy"].items())
+        print(f"Recommended: {best['variant']}")
+        print(f"Deploy with: {env} python pos_system.py")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Quantize the POS detector and compare latency / accuracy against FP32."
+    )
+    parser.add_argument("frames_dir", help="folder of recorded counter frames (images or videos)")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--out-dir", default=os.path.join(os.path.dirname(__file__), "quantized"))
+    parser.add_argument("--max-frames", type=int, default=500)
+    parser.add_argument("--calib-frames", type=int, default=100)
+    parser.add_argument("--min-agreement", type=float, default=0.98)
+    parser.add_argument("--report", help="optional path to write the report as JSON")
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames_dir, max_frames=args.max_frames)
+    if not frames:
+        raise RuntimeError(f"No frames found in {args.frames_dir}")
+    calib, eval_frames = split_frames(frames, args.calib_frames)
+    print(f"Loaded {len(frames)} frames ({len(calib)} calibration, {len(eval_frames)} evaluation)")
+
+    # Only score the classes the POS actually sells
+    catalog = ItemCatalog()
+    class_ids = sorted(catalog.items.keys())
+
+    variants = build_variants(args.model, calib, args.out_dir)
+    del frames, calib, eval_frames  # each benchmark process reloads its own copy
+
+    rows = build_report(variants, args.frames_dir, args.max_frames, args.calib_frames, class_ids)
+    best = pick_fastest(rows, args.min_agreement)
+    print_report(rows, best)
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"rows": rows, "recommended": best and best["variant"]}, f, indent=2)
+        print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import json
+import os
+import threading
+import time
+
+# Snapshot lives next to this file so a restarted lane finds it again
+SNAPSHOT_PATH = os.path.join(os.path.dirname(__file__), "session_snapshot.json")
+SNAPSHOT_VERSION = 1
+
+# Older snapshots belong to a previous customer, not an interrupted checkout
+SNAPSHOT_MAX_AGE_S = 10 * 60
+# While a session is open, re-save at least this often so an idle customer's
+# cart does not look stale just because nothing changed
+SNAPSHOT_REFRESH_S = 60
+
+# Gesture phases pos_system.py understands
+PHASES = ("WAIT_OPEN", "WAIT_CLOSED")
+
+
+class SessionStore:
+    """
+    Crash-safe snapshot of the open checkout session.
+
+    update() is called every frame but only hands a new state to the
+    background writer when something changed (or, while a session is open,
+    every SNAPSHOT_REFRESH_S to keep saved_at fresh). The writer always writes the
+    latest state (older pending ones are dropped) to a temp file and
+    os.replace()s it over the snapshot, so a crash never leaves a half
+    written file behind.
+    """
+
+    def __init__(self, path: str = SNAPSHOT_PATH, max_age_s: float = SNAPSHOT_MAX_AGE_S):
+        self.path = path
+        self.max_age_s = max_age_s
+        self._last_signature = None
+        self._last_saved_at = 0.0
+        self._pending = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+
+    # ------------------------------
+    # Loading
+    # ------------------------------
+    def load(self):
+        """
+        Return the last snapshot as a dict, or None if there is no usable one.
+        Keys: session_open, phase, items {class_id: qty}, counted_tracks [(cid, tid)].
+        Malformed, outdated or stale snapshots are deleted so the lane always starts.
+        """
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+
+            if data.get("version") != SNAPSHOT_VERSION:
+                self._discard("version mismatch")
+                return None
+
+            age_s = time.time() - float(data["saved_at"])
+            if age_s > self.max_age_s:
+                self._discard(f"{age_s / 60:.0f} min old")
+                return None
+
+            if data["phase"] not in PHASES:
+                self._discard(f"unknown phase {data['phase']!r}")
+                return None
+
+            state = {
+                "session_open": bool(data["session_open"]),
+                "phase": str(data["phase"]),
+                "items": {int(cid): int(qty) for cid, qty in data["items"].items()},
+                "counted_tracks": [(int(cid), int(tid)) for cid, tid in data["counted_tracks"]],
+            }
+        except Exception as e:
+            self._discard(f"unreadable ({type(e).__name__}: {e})")
+            return None
+
+        self._last_signature = self._signature(
+            state["session_open"], state["phase"], state["items"], state["counted_tracks"]
+        )
+        return state
+
+    def _discard(self, reason: str):
+        print(f"[SessionStore] Ignoring snapshot: {reason}")
+        try:
+            os.remove(self.path)
+        except OSError as e:
+            print(f"[SessionStore] Could not delete snapshot: {e}")
+
+    # ------------------------------
+    # Saving
+    # ------------------------------
+    @staticmethod
+    def _signature(session_open, phase, items, counted_tracks):
+        # Counted tracks only change together with the cart, so their count
+        # is enough to notice a change without hashing every pair each frame.
+        return (session_open, phase, tuple(sorted(items.items())), len(counted_tracks))
+
+    def update(self, session_open: bool, phase: str, items, counted_tracks):
+        """
+        Queue a snapshot if the session state changed since the last one.
+        `counted_tracks` may be any sized object with a pairs() method
+        (TrackCounter) or a plain list of (class_id, track_id) pairs.
+        """
+        now = time.time()
+        signature = self._signature(session_open, phase, items, counted_tracks)
+        refresh_due = session_open and now - self._last_saved_at >= SNAPSHOT_REFRESH_S
+        if signature == self._last_signature and not refresh_due:
+            return
+        self._last_signature = signature
+        self._last_saved_at = now
+
+        pairs = counted_tracks.pairs() if hasattr(counted_tracks, "pairs") else list(counted_tracks)
+        state = {
+            "version": SNAPSHOT_VERSION,
+            "saved_at": now,
+            "session_open": session_open,
+            "phase": phase,
+            "items": {str(cid): qty for cid, qty in items.items()},
+            "counted_tracks": [[int(cid), int(tid)] for cid, tid in pairs],
+        }
+        with self._lock:
+            self._pending = state
+        self._wake.set()
+
+    def _write(self, state):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _writer(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+
+            with self._lock:
+                state, self._pending = self._pending, None
+
+            if state is not None:
+                try:
+                    self._write(state)
+                except Exception as e:
+                    print(f"[SessionStore] Snapshot write error: {e}")
+
+            # On close, keep going until a state queued meanwhile is written too
+            with self._lock:
+                if self._closed and self._pending is None:
+                    return
+
+    def close(self):
+        """Flush any pending snapshot and stop the writer thread."""
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=2.0)
+
+
+# Quick manual test
+if __name__ == "__main__":
+    import tempfile
+
+    path = os.path.join(tempfile.mkdtemp(), "snapshot.json")
+
+    store = SessionStore(path)
+    store.update(True, "WAIT_OPEN", {3: 2, 0: 1}, [(3, 1), (3, 2), (0, 4)])
+    store.close()
+
+    start = time.perf_counter()
+    restored = SessionStore(path).load()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"Restored in {elapsed_ms:.2f} ms:", restored)
+
+    # Resume the way pos_system.py does: a Coke counted before the crash is
+    # still on the counter and the new tracker gives it track id 1 again.
+    import numpy as np
+    from postprocess import Detections, TrackCounter
+
+    items = dict(restored["items"])
+    counter = TrackCounter()
+    counter.add_pairs(restored["counted_tracks"])
+    offset = max(tid for _, tid in restored["counted_tracks"]) + 1
+
+    def frame(track_ids, cls):
+        n = len(track_ids)
+        return Detections(np.zeros((n, 4), dtype=np.int32), np.ones(n, dtype=np.float32),
+                          np.array(cls, dtype=np.int64), np.array(track_ids, dtype=np.int64) + offset)
+
+    settle = 2
+    for dets in [frame([1], [3]), frame([1], [3]), frame([1, 2], [3, 0])]:
+        new_idx = counter.add_new(dets)
+        if settle > 0:
+            settle -= 1
+            new_idx = new_idx[:0]
+        for i in new_idx:
+            cid = int(dets.cls[i])
+            items[cid] = items.get(cid, 0) + 1
+
+    # Expected: Coke stays at 2 (not re-added), the newly placed coffee is added
+    print("Cart after resume:", items)